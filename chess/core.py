@@ -6,7 +6,9 @@ Created on Fri Mar  8 09:57:04 2019
 """
 import enum
 import itertools
+import random
 import time
+import types
 
 ###############################################################################
 #  GLOBALS                                                                    #
@@ -17,6 +19,12 @@ N_RANKS = 8
 N_FILES = 8
 RANK_ZERO = "8"
 FILE_ZERO = "A"
+# Square name characters by row/col and back ( see Square.file_to_col, ... )
+FILE_LETTERS = tuple( chr(ord(FILE_ZERO) + col) for col in range(N_FILES) )
+RANK_DIGITS = tuple( chr(ord(RANK_ZERO) - row) for row in range(N_RANKS) )
+FILE_COLS = { letter: col for col, letter in enumerate(FILE_LETTERS) }
+FILE_COLS.update({ letter.lower(): col for letter, col in FILE_COLS.items() })
+RANK_ROWS = { digit: row for row, digit in enumerate(RANK_DIGITS) }
 
 UNICODE_PIECES = False
 UNICODE_PIECE_SYMBOLS = {
@@ -29,18 +37,234 @@ UNICODE_PIECE_SYMBOLS = {
 }
 
 
+# BOARD STRINGS
+EDGE_LINE = "+" + "---+" * N_FILES
+PIECE_LINE = "|" + "{}|" * N_FILES
+
+# BITBOARDS
+MASK_EMPTY = 0
+
+# Positions kept in each board's allowed move cache
+MOVE_CACHE_SIZE = 4096
+
+def scan_forward(mask):
+    """
+    Iterate through mask, yielding set bit indices from LSB to MSB.
+    """
+    while mask:
+        r = mask & -mask
+        yield r.bit_length() - 1
+        mask ^= r
+
+def sign(x):
+    """
+    Sign of x as -1, 0 or 1.
+    """
+    return (x > 0) - (x < 0)
+
+
 class Color(enum.Enum):
     WHITE = -1
     BLACK = 1
     DRAW = 0
 
-    @property
-    def opponent(self):
-        return Color(-self.value)
+    def __init__(self, value):
+        # Plain attributes so hot paths skip the enum value descriptor
+        self.orientation = value
 
-    @property
-    def orientation(self):
-        return self.value
+for _color in Color:
+    _color.opponent = Color(-_color.value)
+
+# ZOBRIST HASHING ( fixed seed so position keys are reproducible )
+_ZOBRIST_RANDOM = random.Random(20190308)
+
+def zobrist_keys(n):
+    """
+    Generate a list of n random 64 bit keys.
+    """
+    return [ _ZOBRIST_RANDOM.getrandbits(64) for _ in range(n) ]
+
+ZOBRIST_TURN = zobrist_keys(1)[0]
+ZOBRIST_CASTLE = {
+    color: dict(zip(("Q", "K"), zobrist_keys(2))) for color in (Color.WHITE, Color.BLACK)
+}
+ZOBRIST_EN_PASSANT = zobrist_keys(N_FILES)
+
+###############################################################################
+#  ATTACK TABLES                                                              #
+###############################################################################
+DIAGONAL_DELTAS = ( (-1, -1), (-1, 1), (1, -1), (1, 1) )
+RANK_DELTAS = ( (0, -1), (0, 1) )
+FILE_DELTAS = ( (-1, 0), (1, 0) )
+
+def _sliding_attacks(index, occupied, deltas):
+    """
+    Mask of squares reached from index by sliding along each (d_row, d_col)
+    delta. A ray stops at (and includes) the first occupied square.
+    """
+    attacks = MASK_EMPTY
+    row_0, col_0 = divmod(index, N_FILES)
+    for d_row, d_col in deltas:
+        row = row_0 + d_row
+        col = col_0 + d_col
+        while 0 <= row < N_RANKS and 0 <= col < N_FILES:
+            mask = 1 << (N_FILES * row + col)
+            attacks |= mask
+            if occupied & mask:
+                break
+            row += d_row
+            col += d_col
+    return attacks
+
+def _ray_ends(index, deltas):
+    """
+    Mask of the last on-board square of each ray from index.
+    """
+    ends = MASK_EMPTY
+    for d_row, d_col in deltas:
+        row, col = divmod(index, N_FILES)
+        while 0 <= row + d_row < N_RANKS and 0 <= col + d_col < N_FILES:
+            row += d_row
+            col += d_col
+        ends |= 1 << (N_FILES * row + col)
+    return ends
+
+def _carry_rippler(mask):
+    """
+    Iterate all subsets of mask ( Carry-Rippler trick ).
+    """
+    subset = MASK_EMPTY
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            break
+
+def _attack_table(deltas):
+    """
+    Build the relevant-occupancy masks and the attack lookup for each square.
+    Attacks are looked up with table[index][mask[index] & occupied].
+    """
+    mask_table = [ ]
+    attack_table = [ ]
+    for index in range(N_RANKS * N_FILES):
+        mask = _sliding_attacks(index, MASK_EMPTY, deltas) & ~_ray_ends(index, deltas)
+        attack_table.append({ subset: _sliding_attacks(index, subset, deltas)
+                              for subset in _carry_rippler(mask) })
+        mask_table.append(mask)
+    return mask_table, attack_table
+
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = _attack_table(DIAGONAL_DELTAS)
+RANK_MASKS, RANK_ATTACKS = _attack_table(RANK_DELTAS)
+FILE_MASKS, FILE_ATTACKS = _attack_table(FILE_DELTAS)
+
+def diagonal_attacks(index, occupied):
+    """
+    Mask of squares attacked diagonally from index.
+    """
+    return DIAGONAL_ATTACKS[index][DIAGONAL_MASKS[index] & occupied]
+
+def straight_attacks(index, occupied):
+    """
+    Mask of squares attacked along the rank and file of index.
+    """
+    return ( RANK_ATTACKS[index][RANK_MASKS[index] & occupied] |
+             FILE_ATTACKS[index][FILE_MASKS[index] & occupied] )
+
+def leaper_deltas(step_0, step_1):
+    """
+    All (d_row, d_col) jumps that move step_0 along one axis and step_1
+    along the other.
+    """
+    return tuple(set( (s_row * d_row, s_col * d_col)
+                      for d_row, d_col in itertools.permutations([step_0, step_1])
+                      for s_row, s_col in itertools.product([1, -1], repeat=2) ))
+
+def _leaper_table(deltas):
+    """
+    Build the mask of on-board jump targets for each square.
+    """
+    table = [ ]
+    for index in range(N_RANKS * N_FILES):
+        row_0, col_0 = divmod(index, N_FILES)
+        mask = MASK_EMPTY
+        for d_row, d_col in deltas:
+            row = row_0 + d_row
+            col = col_0 + d_col
+            if 0 <= row < N_RANKS and 0 <= col < N_FILES:
+                mask |= 1 << (N_FILES * row + col)
+        table.append(mask)
+    return table
+
+KNIGHT_DELTAS = frozenset(leaper_deltas(2, 1))
+KING_DELTAS = frozenset(leaper_deltas(1, 0) + leaper_deltas(1, 1))
+ZEBRA_DELTAS = frozenset(leaper_deltas(3, 2))
+GIRAFFE_DELTAS = frozenset(leaper_deltas(4, 1))
+
+KNIGHT_ATTACKS = _leaper_table(KNIGHT_DELTAS)
+KING_ATTACKS = _leaper_table(KING_DELTAS)
+ZEBRA_ATTACKS = _leaper_table(ZEBRA_DELTAS)
+GIRAFFE_ATTACKS = _leaper_table(GIRAFFE_DELTAS)
+ELEPHANT_ATTACKS = {
+    color: _leaper_table(leaper_deltas(1, 1) + ( (color.orientation, 0), ))
+    for color in (Color.WHITE, Color.BLACK)
+}
+PAWN_PUSHES = {
+    color: _leaper_table([ (color.orientation, 0) ]) for color in (Color.WHITE, Color.BLACK)
+}
+PAWN_ATTACKS = {
+    color: _leaper_table([ (color.orientation, 1), (color.orientation, -1) ])
+    for color in (Color.WHITE, Color.BLACK)
+}
+
+def _line_tables():
+    """
+    Build the BETWEEN and LINE lookups for every pair of squares. Both are
+    empty for squares that do not share a rank, file or diagonal.
+    BETWEEN[a][b] -> squares strictly between a and b
+    LINE[a][b] -> whole board line through a and b ( both included )
+    """
+    n_squares = N_RANKS * N_FILES
+    between = [ [ MASK_EMPTY ] * n_squares for _ in range(n_squares) ]
+    line = [ [ MASK_EMPTY ] * n_squares for _ in range(n_squares) ]
+    for index in range(n_squares):
+        for d_row, d_col in DIAGONAL_DELTAS + RANK_DELTAS + FILE_DELTAS:
+            deltas = ( (d_row, d_col), (-d_row, -d_col) )
+            full = _sliding_attacks(index, MASK_EMPTY, deltas) | 1 << index
+            # Walk the ray once, collecting the squares passed so far
+            path = MASK_EMPTY
+            row, col = divmod(index, N_FILES)
+            while 0 <= row + d_row < N_RANKS and 0 <= col + d_col < N_FILES:
+                row += d_row
+                col += d_col
+                target = N_FILES * row + col
+                between[index][target] = path
+                line[index][target] = full
+                path |= 1 << target
+    return between, line
+
+BETWEEN, LINE = _line_tables()
+
+def _castle_path_table():
+    """
+    Build the castling path for each king and rook on the same rank: the
+    king square and the next two squares toward the rook ( stopping at
+    the rook ). Empty for squares on different ranks.
+    """
+    n_squares = N_RANKS * N_FILES
+    paths = [ [ MASK_EMPTY ] * n_squares for _ in range(n_squares) ]
+    for king in range(n_squares):
+        for rook in range(n_squares):
+            if king == rook or king // N_FILES != rook // N_FILES:
+                continue
+            step = sign(rook - king)
+            for target in range(king, king + 3 * step, step):
+                paths[king][rook] |= 1 << target
+                if target == rook:
+                    break
+    return paths
+
+CASTLE_PATHS = _castle_path_table()
 
 ###############################################################################
 #  BOARD CORE                                                                 #
@@ -53,6 +277,8 @@ class Square:
     ROW_RANGE = range(N_RANKS)
     COL_RANGE = range(N_FILES)
 
+    __slots__ = ( "row", "col", "index", "rank", "file", "_str" )
+
     def __init__(self, row, col, rank=None, file=None):
         """
         Takes row and col coordinates as input.
@@ -64,26 +290,12 @@ class Square:
             raise IndexError("File out of bounds!")
         self.row = row
         self.col = col
-        self._rank = rank
-        self._file = file
-
-    @property
-    def file(self):
-        """
-        Only generate file string when asked first time.
-        """
-        if self._file is None:
-            self._file = self.col_to_file(self.col)
-        return self._file
-
-    @property
-    def rank(self):
-        """
-        Only generate rank string when asked first time.
-        """
-        if self._rank is None:
-            self._rank = self.row_to_rank(self.row)
-        return self._rank
+        # Bit index of the square in a board mask ( row-major from A8 )
+        self.index = N_FILES * row + col
+        # Rank and file strings
+        self.rank = RANK_DIGITS[row] if rank is None else rank
+        self.file = FILE_LETTERS[col] if file is None else file
+        self._str = f"{self.file}{self.rank}"
 
     @classmethod
     def from_str(cls, pos_str):
@@ -91,11 +303,14 @@ class Square:
         Initializes a Square from a position string.
         A8 -> Square(0, 0)
         """
+        # Known names skip parsing
+        square = SQUARE_NAMES.get(pos_str)
+        if square is not None:
+            return square
         if len(pos_str) != 2:
             raise ValueError("Square position string must be 2 characters!")
         pos_str = pos_str.upper()
-        pos_tup = ( cls.rank_to_row(pos_str[1]), cls.file_to_col(pos_str[0]) )
-        return cls(*pos_tup, rank=pos_str[1], file=pos_str[0])
+        return cls.from_coord(cls.rank_to_row(pos_str[1]), cls.file_to_col(pos_str[0]))
 
     @classmethod
     def from_tup(cls, pos_tup):
@@ -105,7 +320,19 @@ class Square:
         if ( len(pos_tup) != 2 or not isinstance(pos_tup[0], int)
                                or not isinstance(pos_tup[1], int) ):
                 raise ValueError("Square position tuple must contain two integers!")
-        return cls(*pos_tup)
+        return cls.from_coord(*pos_tup)
+
+    @staticmethod
+    def from_coord(row, col):
+        """
+        Get the shared Square at row, col. Squares are built once at import
+        ( see SQUARES ) and reused.
+        """
+        if not 0 <= row < N_RANKS:
+            raise IndexError("Rank out of bounds!")
+        if not 0 <= col < N_FILES:
+            raise IndexError("File out of bounds!")
+        return SQUARES[N_FILES * row + col]
 
     @staticmethod
     def file_to_col(file):
@@ -115,6 +342,8 @@ class Square:
         """
         if not isinstance(file, str):
             raise TypeError("File must be a string!")
+        if file in FILE_COLS:
+            return FILE_COLS[file]
         if not file.isalpha():
             raise ValueError("File must be an alphanumeric letter!")
         return ord(file.upper()) - ord(FILE_ZERO)
@@ -127,6 +356,8 @@ class Square:
         """
         if not isinstance(col, int):
             raise TypeError("Column must be an int!")
+        if 0 <= col < N_FILES:
+            return FILE_LETTERS[col]
         return chr(ord(FILE_ZERO) + col)
 
     @staticmethod
@@ -137,6 +368,8 @@ class Square:
         """
         if not isinstance(rank, str):
             raise TypeError("Rank must be a string!")
+        if rank in RANK_ROWS:
+            return RANK_ROWS[rank]
         if not rank.isdigit():
             raise ValueError("Rank must be a digit string!")
         return ord(RANK_ZERO) - ord(rank)
@@ -149,6 +382,8 @@ class Square:
         """
         if not isinstance(row, int):
             raise TypeError("Row must be an int!")
+        if 0 <= row < N_RANKS:
+            return RANK_DIGITS[row]
         return chr(ord(RANK_ZERO) - row)
 
     def __str__(self):
@@ -156,14 +391,14 @@ class Square:
         Return string representation of the square's position
         ( (0, 0)->'A8', (1, 1)->'B8', ... )
         """
-        return f"{self.file}{self.rank}"
+        return self._str
 
     def __iter__(self):
         yield self.row
         yield self.col
 
     def __repr__(self):
-        return self.__str__()
+        return self._str
 
     def __hash__(self):
         return N_RANKS * self.row + self.col
@@ -183,6 +418,13 @@ class Square:
             return (self.row - other.row, self.col - other.col)
 
 
+# Every board square, indexed by bit index
+SQUARES = [ Square(row, col) for row in Square.ROW_RANGE for col in Square.COL_RANGE ]
+# Every board square by upper and lower case name
+SQUARE_NAMES = { name: square for square in SQUARES
+                              for name in ( str(square), str(square).lower() ) }
+
+
 class Board:
 
     fen_library = {
@@ -200,7 +442,6 @@ class Board:
 
     def __init__(self, fen="Standard", board=None):
         self._board_fmt_str = None
-        self._square_list = None
         if fen is None:
             self.reset(board=board)
         else:
@@ -211,27 +452,46 @@ class Board:
         Initializes an empty board, clears game history, sets winner to None
         and to_move to WHITE. If board is specified, use that as the board.
         """
-        # Construct board
-        if board is None:
-            self.board = [ [ None for _ in Square.COL_RANGE ]
-                                  for _ in Square.ROW_RANGE
-                                  ]
-        else:
-            self.board = board
+        # Construct flat board indexed by bit index ( row-major from A8 )
+        self.board = [ None ] * (N_RANKS * N_FILES)
+        # Zobrist key of the piece placement ( see zobrist_key )
+        self._piece_key = 0
+        # Material point spread ( see evaluate )
+        self._material = 0
+        # Formatted piece rows as ( forward, reversed ), None when stale
+        self._row_strs = [ None ] * N_RANKS
+        self._row_unicode = UNICODE_PIECES
+        # Bit masks of occupied squares by piece type and by color
+        self._pieces = { }
+        self._occupied = {
+            None: MASK_EMPTY, # ANY COLOR
+            Color.WHITE: MASK_EMPTY,
+            Color.BLACK: MASK_EMPTY,
+        }
+        if board is not None:
+            # Accept a flat board or a list of rows
+            if len(board) == N_RANKS and isinstance(board[0], (list, tuple)):
+                board = itertools.chain.from_iterable(board)
+            for index, piece in enumerate(board):
+                self._set_coord(*divmod(index, N_FILES), piece)
         # Game trackers
         self.move_history = [ ]
         self.castle_states = {
             Color.WHITE : {"Q": True, "K": True},
             Color.BLACK : {"Q": True, "K": True},
         }
+        self._castle_key = 0
+        for color, states in self.castle_states.items():
+            for side in states:
+                self._castle_key ^= ZOBRIST_CASTLE[color][side]
         self.rook_homes = {
             Color.WHITE: [
-                Square(N_RANKS - 1, 0),
-                Square(N_RANKS - 1, N_FILES - 1)
+                Square.from_coord(N_RANKS - 1, 0),
+                Square.from_coord(N_RANKS - 1, N_FILES - 1)
             ],
             Color.BLACK: [
-                Square(0, 0),
-                Square(0, N_FILES - 1)
+                Square.from_coord(0, 0),
+                Square.from_coord(0, N_FILES - 1)
             ],
         }
         self.en_passant_square = None
@@ -240,21 +500,58 @@ class Board:
         self.winner = None
         self.halfmoves = 0
         self.fullmoves = 1
-
-        self._allowed_moves = dict( )
-        self._last_move_recompute = None
-        self._check = False
-        self._last_check_recompute = None
+        self._undo_stack = [ ]
+        # Attacked squares by color, valid while the piece key is unchanged
+        self._attacked = { }
+        self._attacked_key = None
+        self._key_history = [ ]
+
+        # Move and check state of the current position ( None until computed,
+        # reset by push_move/undo_move ) and allowed moves of past positions
+        self._allowed_moves = None
+        self._check = None
+        self._move_cache = { }
         return
 
     def _set_coord(self, row, col, piece):
-        self.board[row][col] = piece
+        self._del_coord(row, col)
+        if piece is not None:
+            mask = 1 << (N_FILES * row + col)
+            piece_type = type(piece)
+            self._pieces[piece_type] = self._pieces.get(piece_type, MASK_EMPTY) | mask
+            self._occupied[None] |= mask
+            self._occupied[piece.color] |= mask
+            self._piece_key ^= piece._zobrist[piece.color][N_FILES * row + col]
+            self._material -= (piece.value or 0) * piece.color.orientation
+            self.board[N_FILES * row + col] = piece
 
     def _get_coord(self, row, col):
-        return self.board[row][col]
+        return self.board[N_FILES * row + col]
 
     def _del_coord(self, row, col):
-        self.board[row][col] = None
+        self._row_strs[row] = None
+        piece = self.board[N_FILES * row + col]
+        if piece is not None:
+            not_mask = ~(1 << (N_FILES * row + col))
+            self._pieces[type(piece)] &= not_mask
+            self._occupied[None] &= not_mask
+            self._occupied[piece.color] &= not_mask
+            self._piece_key ^= piece._zobrist[piece.color][N_FILES * row + col]
+            self._material += (piece.value or 0) * piece.color.orientation
+            self.board[N_FILES * row + col] = None
+
+    def _get_index(self, index):
+        """
+        Get the piece at a bit index.
+        """
+        return self.board[index]
+
+    def pieces_mask(self, piece_type, color=None):
+        """
+        Get mask of squares occupied by pieces of the specified type and
+        color ( either color if color is None ).
+        """
+        return self._pieces.get(piece_type, MASK_EMPTY) & self._occupied[color]
 
     def __setitem__(self, locus, piece):
         """
@@ -264,22 +561,36 @@ class Board:
         if not (piece is None or isinstance(piece, Piece)):
             raise TypeError("Board can only contain Piece and NoneType objects!")
 
-        if isinstance(locus, tuple) or isinstance(locus, Square):
-            self._set_coord(*locus, piece)
-        elif isinstance(locus, str):
-            self._set_coord(*Square.from_str(locus), piece)
+        if isinstance(locus, Square):
+            self._set_coord(locus.row, locus.col, piece)
         else:
-            raise TypeError("Invalid square locus for board!")
+            self._set_coord(*divmod(self._locus_index(locus), N_FILES), piece)
 
     def __getitem__(self, locus):
         """
         Gets the piece on the specified square position (None for empty square).
         board['A1'] -> Rook(White, A1)
         """
-        if isinstance(locus, tuple) or isinstance(locus, Square):
-            return self._get_coord(*locus)
+        if isinstance(locus, Square):
+            return self.board[locus.index]
+        return self.board[self._locus_index(locus)]
+
+    @staticmethod
+    def _locus_index(locus):
+        """
+        Get the bit index of a square locus ( Square, bit index, coordinate
+        tuple or position string ). Raise IndexError if it is off the board.
+        """
+        if isinstance(locus, Square):
+            return locus.index
+        elif isinstance(locus, int):
+            if not 0 <= locus < N_RANKS * N_FILES:
+                raise IndexError("Square out of bounds!")
+            return locus
+        elif isinstance(locus, tuple):
+            return Square.from_coord(*locus).index
         elif isinstance(locus, str):
-            return self._get_coord(*Square.from_str(locus))
+            return Square.from_str(locus).index
         else:
             raise TypeError("Invalid square locus for board!")
 
@@ -304,142 +615,217 @@ class Board:
         works backwards.
         """
         if reverse:
-            row_iter = range(N_RANKS - 1, -1, -1)
-            col_iter = range(N_FILES - 1, -1, -1)
+            yield from reversed(SQUARES)
         else:
-            row_iter = range(0, N_RANKS)
-            col_iter = range(0, N_FILES)
-        for row in row_iter:
-            for col in col_iter:
-                yield Square(row, col)
+            yield from SQUARES
 
     def square_list(self, reverse=False):
         """
         Get a flat list of all squares on the board. Returns the reverse order
-        if reverse is True. Stores the square_generator into a list one time to
-        remove the need to repeatedly generate squares.
+        if reverse is True.
         """
-        # Construct list if it does not yet exist
-        if self._square_list is None:
-            self._square_list = list(self.square_generator())
-        # Return list in specified order
         if reverse:
-            return reversed(self._square_list)
+            return reversed(SQUARES)
         else:
-            return self._square_list
+            return SQUARES
 
     def get_square(self, row, col):
         """
         Efficiently get the square at specified row, col.
         """
-        square_index = N_RANKS * row + col
-        return self.square_list()[square_index]
+        return SQUARES[N_FILES * row + col]
+
+    def get_index_square(self, index):
+        """
+        Efficiently get the square at specified bit index.
+        """
+        return SQUARES[index]
 
     def piece_generator(self, color=None):
         """
         Yields all pieces on the current board. If color is specified, only
         pieces of the specified color are yielded.
         """
-        for row in self.board:
-            for piece in row:
-                if piece is None:
-                    continue
-                elif color is None or piece.color is color:
-                    yield piece
+        board = self.board
+        for index in scan_forward(self._occupied[color]):
+            yield board[index]
 
     def coord_slice(self, row_0, col_0, row_1, col_1):
         """
         Generator that yields the squares on the board between from_square and
         to_square, inclusive. Only works for square/diagonal displacements.
         """
+        for index in self.index_slice(row_0, col_0, row_1, col_1):
+            yield divmod(index, N_FILES)
+
+    @staticmethod
+    def index_slice(row_0, col_0, row_1, col_1):
+        """
+        Range of the bit indices between the two coordinates, inclusive.
+        Only works for square/diagonal displacements.
+        """
         d_row = row_1 - row_0
         d_col = col_1 - col_0
-        # VERTICAL
-        if d_col == 0:
-            dr = (1, -1)[row_1 < row_0] # sign of row change
-            for row in range(row_0, row_1 + dr, dr):
-                yield row, col_0
-        # HORIZONTAL
-        elif d_row == 0:
-            dc = (1, -1)[col_1 < col_0] # sign of col change
-            for col in range(col_0, col_1 + dc, dc):
-                yield row_0, col
-        # DIAGONAL
-        elif abs( d_row ) == abs( d_col ):
-            dr = (1, -1)[d_row < 0] # sign of row change
-            dc = (1, -1)[d_col < 0] # sign of col change
-            r_to_c = dr * dc # 1 if same, -1 if opposite
-            for r in range(0, d_row + dr, dr):
-                row = row_0 + r
-                col = col_0 + r * r_to_c
-                yield row, col
-        else:
+        if d_row and d_col and abs(d_row) != abs(d_col):
             raise IndexError("Slices must be square or diagonal!")
+        # Flat index step along the line ( 1 for a single square )
+        step = N_FILES * sign(d_row) + sign(d_col) or 1
+        return range(N_FILES * row_0 + col_0, N_FILES * row_1 + col_1 + step, step)
 
     def square_slice(self, row_0, col_0, row_1, col_1):
         """
         Generator that yields the squares on the board between from_square and
         to_square, inclusive. Only works for square/diagonal displacements.
         """
-        for row, col in self.coord_slice(row_0, col_0, row_1, col_1):
-            yield self.get_square(row, col)
+        for index in self.index_slice(row_0, col_0, row_1, col_1):
+            yield SQUARES[index]
 
     def piece_slice(self, row_0, col_0, row_1, col_1):
         """
         Generator that yields pieces on the board from_square to_square,
         inclusive. Only works for square/diagonal displacements.
         """
-        for row, col in self.coord_slice(row_0, col_0, row_1, col_1):
-            yield self.board[row][col]
+        board = self.board
+        for index in self.index_slice(row_0, col_0, row_1, col_1):
+            yield board[index]
 
     def find_pieces(self, piece_type, color):
         """
         Yields pieces of the specified type and color from the board.
         """
-        for piece in self.piece_generator(color=color):
-            if isinstance(piece, piece_type):
-                yield piece
+        for index in scan_forward(self.pieces_mask(piece_type, color=color)):
+            yield self._get_index(index)
 
     def obstruction(self, from_square, to_square):
         """
         Return True if there is a piece between the two squares.
         Return False if the path is clear.
         """
-        return any(list(self.piece_slice(*from_square, *to_square))[1:-1])
+        row_0, col_0 = from_square
+        row_1, col_1 = to_square
+        between = BETWEEN[N_FILES * row_0 + col_0][N_FILES * row_1 + col_1]
+        return bool(between & self._occupied[None])
+
+    def pinned_mask(self, color):
+        """
+        Get mask of the color's pieces that are pinned to their king.
+        """
+        king = self.find_king(color=color)
+        king_index = king.square.index
+        occupied = self._occupied[None]
+        enemies = self._occupied[color.opponent]
+        pieces = self._pieces
+        empty = MASK_EMPTY
+        # Sliders that would see the king on an empty board
+        pinners = enemies & (
+            diagonal_attacks(king_index, MASK_EMPTY) & ( pieces.get(Bishop, empty) | pieces.get(Queen, empty) ) |
+            straight_attacks(king_index, MASK_EMPTY) & ( pieces.get(Rook, empty) | pieces.get(Queen, empty) )
+        )
+        # Other sliding pieces are checked against their move rules
+        for piece_type, mask in pieces.items():
+            if piece_type in TABLE_PIECES or piece_type.jumps or not mask & enemies:
+                continue
+            for piece in self.find_pieces(piece_type, color.opponent):
+                if piece.capture_mask() >> king_index & 1:
+                    pinners |= 1 << piece.square.index
+        pinned = MASK_EMPTY
+        for index in scan_forward(pinners):
+            blockers = BETWEEN[index][king_index] & occupied
+            # Exactly one blocker, and it is one of our own pieces
+            if blockers and not blockers & (blockers - 1) and blockers & self._occupied[color]:
+                pinned |= blockers
+        return pinned
+
+    def attacked_mask(self, color):
+        """
+        Get mask of all squares attacked by pieces of color. Cached until
+        the piece placement changes.
+        """
+        if self._attacked_key != self._piece_key:
+            self._attacked = { }
+            self._attacked_key = self._piece_key
+        if color not in self._attacked:
+            self._attacked[color] = self._attacked_mask(color)
+        return self._attacked[color]
+
+    def _attacked_mask(self, color):
+        occupied = self._occupied[None]
+        attacked = MASK_EMPTY
+        for piece in self.piece_generator(color=color):
+            attacks = piece.attack_mask(occupied)
+            if attacks is None:
+                for index in self.valid_targets_piece(piece):
+                    attacked |= 1 << index
+            else:
+                attacked |= attacks
+        return attacked
+
+    def attackers_mask(self, index, color, occupied=None):
+        """
+        Get mask of the pieces of color that are eyeing the square at the
+        bit index. Looks up the attack tables in reverse from the square.
+        If occupied is given, sliders are blocked by it instead of the board
+        ( pieces outside TABLE_PIECES always use the board ).
+        """
+        if occupied is None:
+            occupied = self._occupied[None]
+        pieces = self._pieces
+        empty = MASK_EMPTY
+        attackers = (
+            KNIGHT_ATTACKS[index] & ( pieces.get(Knight, empty) | pieces.get(Centaur, empty) ) |
+            KING_ATTACKS[index] & ( pieces.get(King, empty) | pieces.get(Centaur, empty) ) |
+            ZEBRA_ATTACKS[index] & pieces.get(Zebra, empty) |
+            GIRAFFE_ATTACKS[index] & pieces.get(Giraffe, empty) |
+            # Pawns and elephants attack forward, so look backward from the square
+            PAWN_ATTACKS[color.opponent][index] & pieces.get(Pawn, empty) |
+            ELEPHANT_ATTACKS[color.opponent][index] & pieces.get(Elephant, empty) |
+            diagonal_attacks(index, occupied) & ( pieces.get(Bishop, empty) | pieces.get(Queen, empty) ) |
+            straight_attacks(index, occupied) & ( pieces.get(Rook, empty) | pieces.get(Queen, empty) )
+        ) & self._occupied[color]
+        # Pieces without a reverse table are checked one by one
+        row, col = divmod(index, N_FILES)
+        for piece_type, mask in pieces.items():
+            if piece_type in TABLE_PIECES or not mask & self._occupied[color]:
+                continue
+            for piece in self.find_pieces(piece_type, color):
+                attacks = piece.attack_mask(occupied)
+                if attacks is not None:
+                    if attacks >> index & 1:
+                        attackers |= 1 << piece.square.index
+                    continue
+                if not piece.capture_mask() >> index & 1:
+                    continue
+                elif not piece.jumps and self.obstruction(piece.square, (row, col)):
+                    continue
+                attackers |= 1 << piece.square.index
+        return attackers
 
-    def has_attackers(self, square, color):
+    def has_attackers(self, index, color):
         """
-        Return True if any pieces of color are eyeing the square.
-        Return False otherwise
+        Return True if any pieces of color are eyeing the square at the
+        bit index. Return False otherwise
         """
-        for piece in self.piece_generator(color=color):
-            # Check if move is valid for piece
-            d_row, d_col = square - piece.square
-            if not piece.move_is_valid(d_row, d_col, capture=True):
-                continue
-            # Check for obstructions
-            elif not piece.jumps and self.obstruction(piece.square, square):
-                continue
-            return True
-        return False
+        return bool(self.attackers_mask(index, color))
 
     def verify_castle(self, king, rook):
         """
         Return True if the King and Rook can castle.
         Return False otherwise.
         """
-        if self.obstruction(king.square, rook.square):
+        king_index = king.square.index
+        rook_index = rook.square.index
+        if king.row != rook.row:
+            return False
+        if BETWEEN[king_index][rook_index] & self._occupied[None]:
             return False
         # Make sure king doesn't cross through check (include current square)
-        path = list(self.square_slice(*king.square, *rook.square))[:3]
-        for square in path:
-            if self.has_attackers(square, king.color.opponent):
-                return False
+        if CASTLE_PATHS[king_index][rook_index] & self.attacked_mask(king.color.opponent):
+            return False
         return True
 
     def valid_castles(self, king):
         """
-        Yield valid castling moves for the input king.
+        Yield valid castling moves for the input king as bit indices.
         """
         # Check queen side
         for square, side, d_col in zip(self.rook_homes[king.color], ("Q", "K"), (-2, 2)):
@@ -447,72 +833,90 @@ class Board:
             if isinstance(rook, Rook):
                 if self.castle_states[king.color][side]:
                     if self.verify_castle(king, rook):
-                        yield self.get_square(king.row, king.col + d_col)
+                        yield N_FILES * king.row + king.col + d_col
 
     def valid_targets_king(self, king):
         """
-        Yield all valid target squares for a king. Gets list of
+        Yield all valid target bit indices for a king. Gets list of
         normal king moves, removes moves that leave the king in check, and adds
         valid castling moves.
         """
         # Normal moves
-        for square in self.valid_targets_piece(king):
+        for index in self.valid_targets_piece(king):
             # Keep moves that do not result in check
-            if not self.has_attackers(square, king.color.opponent):
-                yield square
+            if not self.has_attackers(index, king.color.opponent):
+                yield index
         # Castling moves
-        for square in self.valid_castles(king):
-            yield square
+        for index in self.valid_castles(king):
+            yield index
 
     def valid_targets_pawn(self, pawn):
         """
-        Yield all valid target squares for a pawn. Gets list of
+        Yield all valid target bit indices for a pawn. Gets list of
         normal pawn moves, adds captures.
         """
-        # Normal moves
-        for row, col in pawn.pseudovalid_coords_regular():
-            target = self.board[row][col]
-            if target is None:
-                yield self.get_square(row, col)
-            else:
-                break
+        index = pawn.square.index
+        empty = ~self._occupied[None]
+        # Normal moves ( double step only through an empty square )
+        targets = PAWN_PUSHES[pawn.color][index] & empty
+        if targets and not pawn.has_moved:
+            targets |= PAWN_PUSHES[pawn.color][targets.bit_length() - 1] & empty
         # Captures and en passant
-        for row, col in pawn.pseudovalid_coords_capture():
-            target = self.board[row][col]
-            square = self.get_square(row, col)
-            if isinstance(target, Piece) and target.color != pawn.color:
-                yield square
-            elif square == self.en_passant_square:
-                yield square
+        capturable = self._occupied[pawn.color.opponent]
+        if self.en_passant_square is not None:
+            capturable |= 1 << self.en_passant_square.index
+        targets |= PAWN_ATTACKS[pawn.color][index] & capturable
+        yield from scan_forward(targets)
 
     def valid_targets_piece(self, piece):
         """
-        Yield all valid target squares for the specified piece.
+        Yield all valid target bit indices for the specified piece.
         Does not consider whether a move leaves player in check,
         does not consider castling, does not consider en passant.
         """
+        # Each piece class looks up its own attack table
+        attacks = piece.attack_mask(self._occupied[None])
+        if attacks is not None:
+            yield from scan_forward(attacks & ~self._occupied[piece.color])
+            return
+
         for row, col in piece.pseudovalid_coords():
             # Check if out of bounds
-            if not row in Square.ROW_RANGE or not col in Square.COL_RANGE:
+            if not ( 0 <= row < N_RANKS and 0 <= col < N_FILES ):
                 continue
             # Check for target validity
-            target = self.board[row][col]
+            target = self.board[N_FILES * row + col]
             if isinstance(target, Piece) and target.color is piece.color:
                 continue
             # Check for obstructions
-            square = self.get_square(row, col)
             if not piece.jumps:
-                if self.obstruction(piece.square, square):
+                if self.obstruction(piece.square, (row, col)):
                     continue
-            yield square
+            yield N_FILES * row + col
 
     def valid_moves_all(self):
         """
         Return a dictionary of all valid moves in the current board
-        configuration. Keys are from square, values are lists of to squares.
+        configuration. Keys are from square, values are sets of to squares.
         """
         move_lookup = dict( )
-        king_square = self.find_king(color=self.to_move).square
+        for piece, targets in self.legal_targets_generator():
+            # Targets are bit indices until they leave the board
+            cleaned = { self.get_index_square(target) for target in targets }
+            if len(cleaned) > 0:
+                move_lookup[piece.square] = cleaned
+        return move_lookup
+
+    def legal_targets_generator(self):
+        """
+        Yields each piece of the player to move with a lazy generator of its
+        legal target bit indices.
+        """
+        king_index = self.find_king(color=self.to_move).square.index
+        # Only the king, en passant and check evasions need the push/undo
+        # test. Pinned pieces are restricted to the pin line.
+        in_check = self.check
+        pinned = self.pinned_mask(self.to_move)
         for piece in self.piece_generator(color=self.to_move):
             if isinstance(piece, Pawn):
                 piece_targets = self.valid_targets_pawn(piece)
@@ -521,66 +925,144 @@ class Board:
             else:
                 piece_targets = self.valid_targets_piece(piece)
 
-            cleaned = list(self.remove_checks(piece.square, piece_targets, king_square, piece.color))
-            if len(cleaned) > 0:
-                move_lookup[piece.square] = cleaned
-        return move_lookup
+            index = piece.square.index
+            if ( in_check or index == king_index
+                 or (isinstance(piece, Pawn) and self.en_passant_square is not None) ):
+                targets = self.remove_checks(index, piece_targets, king_index, piece.color)
+            elif pinned & (1 << index):
+                # Pinned pieces may only move along the line of the pin
+                pin_line = LINE[king_index][index]
+                targets = ( target for target in piece_targets if pin_line >> target & 1 )
+            else:
+                targets = piece_targets
+            yield piece, targets
 
-    def remove_checks(self, from_square, target_list, king_square, color):
+    def has_legal_moves(self):
         """
-        Step through a target list for a piece. Yield any squares that do not
-        leave the piece color's king in check.
+        Return True if the player to move has any valid move. Stops at the
+        first move found unless the allowed moves are already cached.
         """
-        for to_square in target_list:
+        if self._allowed_moves is not None:
+            return len(self._allowed_moves) > 0
+        for _, targets in self.legal_targets_generator():
+            for _ in targets:
+                return True
+        return False
+
+    def remove_checks(self, from_index, target_list, king_index, color):
+        """
+        Step through a list of target bit indices for a piece. Yield any that
+        do not leave the piece color's king in check.
+        """
+        piece = self.board[from_index]
+        # Unless an en passant capture or a piece outside the attack tables
+        # is involved, test the occupancy after the move without making it
+        if ( self._pieces.keys() <= TABLE_PIECES
+             and not (isinstance(piece, Pawn) and self.en_passant_square is not None) ):
+            occupied = self._occupied[None] & ~(1 << from_index)
+            for to_index in target_list:
+                to_mask = 1 << to_index
+                if from_index == king_index:
+                    attacked_index = to_index
+                else:
+                    attacked_index = king_index
+                # Any piece captured on the target square no longer attacks
+                attackers = self.attackers_mask(attacked_index, color.opponent, occupied | to_mask)
+                if not attackers & ~to_mask:
+                    yield to_index
+            return
+
+        from_square = self.get_index_square(from_index)
+        for to_index in target_list:
             # Try the move on the test_board
-            move = Move.from_squares(from_square, to_square, self, validate=False)
+            move = Move.from_squares(from_square, self.get_index_square(to_index), self, validate=False)
             self.push_move(move)
             # Keep the move if it does not cause check
-            if from_square == king_square and not self.has_attackers(to_square, color.opponent):
-                yield to_square
-            elif not self.has_attackers(king_square, color.opponent):
-                yield to_square
-            # Reset for next test
+            if from_index == king_index:
+                legal = not self.has_attackers(to_index, color.opponent)
+            else:
+                legal = not self.has_attackers(king_index, color.opponent)
+            # Reset before yielding so callers can stop early
             self.undo_move()
+            if legal:
+                yield to_index
 
     @property
     def check(self):
         """
         Update the current check state.
         """
-        if self._last_check_recompute != len(self.move_history):
+        if self._check is None:
             king = self.find_king(color=self.to_move)
-            self._check = self.has_attackers(king.square, king.color.opponent)
-            self._last_check_recompute = len(self.move_history)
+            self._check = self.has_attackers(king.square.index, king.color.opponent)
         return self._check
 
     @property
     def allowed_moves(self):
         """
-        Update the stored dictionary of allowed moves.
-        """
-        if self._last_move_recompute != len(self.move_history):
-            self._allowed_moves = self.valid_moves_all()
-            self._last_move_recompute = len(self.move_history)
+        Update the stored dictionary of allowed moves. Positions that were
+        seen before reuse their cached moves, so the lookup is read-only
+        ( a mapping of from square to frozenset of to squares ).
+        """
+        if self._allowed_moves is None:
+            key = self._move_cache_key()
+            allowed_moves = self._move_cache.get(key)
+            if allowed_moves is None:
+                allowed_moves = types.MappingProxyType({
+                    square: frozenset(targets) for square, targets in self.valid_moves_all().items()
+                })
+                if len(self._move_cache) >= MOVE_CACHE_SIZE:
+                    self._move_cache.clear()
+                self._move_cache[key] = allowed_moves
+            self._allowed_moves = allowed_moves
         return self._allowed_moves
 
+    def _move_cache_key(self):
+        """
+        Key of the current position for the allowed move cache. Pawn double
+        steps depend on has_moved, which the Zobrist key does not cover, and
+        so may the rules of any piece without an attack table.
+        """
+        unmoved = MASK_EMPTY
+        for pawn in self.find_pieces(Pawn, self.to_move):
+            if not pawn.has_moved:
+                unmoved |= 1 << pawn.square.index
+        for piece_type in self._pieces:
+            if piece_type not in TABLE_PIECES:
+                for piece in self.find_pieces(piece_type, None):
+                    if not piece.has_moved:
+                        unmoved |= 1 << piece.square.index
+        return self.zobrist_key, unmoved
+
     def push_move(self, move):
         """
         Takes a move object. Applies the move to the current board.
         """
+        # Store the state that the move cannot reconstruct on undo
+        self._key_history.append(self.zobrist_key)
+        self._undo_stack.append((self.en_passant_square, self.halfmoves, self.fullmoves))
+        # Reset the halfmove clock on pawn moves and captures ( captured
+        # pieces are always removed after the moving piece )
+        if isinstance(move.removals[0], Pawn) or move.removals[-1].color is not self.to_move:
+            self.halfmoves = 0
+        else:
+            self.halfmoves += 1
+        if self.to_move is Color.BLACK:
+            self.fullmoves += 1
         # Apply removals
         for piece in move.removals:
-            del self[piece.square]
+            self._del_coord(piece.row, piece.col)
         # Apply additions
         for piece in move.additions:
-            self[piece.square] = piece
+            self._set_coord(piece.row, piece.col, piece)
         # Update and store game state
         self.move_history.append(move)
         for side, state in move.castle_updates:
-            self.castle_states[self.to_move][side] = state
+            self._set_castle_state(self.to_move, side, state)
         self.en_passant_square = move.en_passant_square
         self.to_move = self.to_move.opponent
-        # TODO: update halfmoves and fullmoves
+        self._allowed_moves = None
+        self._check = None
         return
 
     def undo_move(self):
@@ -594,22 +1076,20 @@ class Board:
         last_move = self.move_history.pop()
         # Revert additions
         for piece in last_move.additions:
-            del self[piece.square]
+            self._del_coord(piece.row, piece.col)
         # Revert removals
         for piece in last_move.removals:
-            self[piece.square] = piece
+            self._set_coord(piece.row, piece.col, piece)
 
         self.to_move = self.to_move.opponent
         # Revert castle bans
         for side, state in last_move.castle_updates:
-            self.castle_states[self.to_move][side] = not state
-        # Get previous en passant
-        if len(self.move_history) > 0:
-            self.en_passant_square = self.move_history[-1].en_passant_square
-        else:
-            self.en_passant_square = None
-
-        # TODO: update halfmoves and fullmoves
+            self._set_castle_state(self.to_move, side, not state)
+        # Restore en passant square and move counters
+        self.en_passant_square, self.halfmoves, self.fullmoves = self._undo_stack.pop()
+        self._key_history.pop()
+        self._allowed_moves = None
+        self._check = None
         return
 
     def process_move(self, move_str, validate=True):
@@ -633,32 +1113,60 @@ class Board:
         """
         if color is None:
             color = self.to_move
-        # Get list of kings for current player
-        king_list = list( self.find_pieces(King, color) )
-        if len(king_list) == 0:
+        # King mask is kept up to date by _set_coord/_del_coord
+        king_mask = self.pieces_mask(King, color)
+        if not king_mask:
             raise InvalidBoardError(f"{color.name} has no king!")
-        elif len(king_list) > 1:
+        elif king_mask & (king_mask - 1):
             raise InvalidBoardError(f"{color.name} has more than one king!")
-        return king_list[0]
+        return self._get_index(king_mask.bit_length() - 1)
 
     def checkmate(self):
         """
         Return True if current player is in checkmate.
         Return False otherwise.
         """
-        if self.check and len(self.allowed_moves) == 0:
+        if self.check and not self.has_legal_moves():
             return True
         return False
 
     def stalemate(self):
         """
-        Return True if current player has no valid moves.
+        Return True if current player is not in check and has no valid moves.
         Return False otherwise.
         """
-        if len(self.allowed_moves) == 0:
+        if not self.check and not self.has_legal_moves():
             return True
         return False
 
+    @property
+    def zobrist_key(self):
+        """
+        Zobrist hash of the current position: piece placement, side to move,
+        castling states and en passant file.
+        """
+        key = self._piece_key ^ self._castle_key
+        if self.to_move is Color.BLACK:
+            key ^= ZOBRIST_TURN
+        if self.en_passant_square is not None:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant_square.col]
+        return key
+
+    def _set_castle_state(self, color, side, state):
+        """
+        Set a castling state and keep its Zobrist key in sync.
+        """
+        if self.castle_states[color][side] != state:
+            self.castle_states[color][side] = state
+            self._castle_key ^= ZOBRIST_CASTLE[color][side]
+
+    def repetition(self, count=3):
+        """
+        Return True if the current position has occurred at least count times.
+        Return False otherwise.
+        """
+        return self._key_history.count(self.zobrist_key) + 1 >= count
+
     def game_over(self):
         """
         Return True if game is over...also set winner.
@@ -667,7 +1175,7 @@ class Board:
         if self.checkmate():
             self.winner = self.to_move.opponent
             return True
-        elif self.stalemate():
+        elif self.stalemate() or self.repetition():
             self.winner = Color.DRAW
             return True
         else:
@@ -675,17 +1183,10 @@ class Board:
 
     def evaluate(self):
         """
-        Returns the current material point spread.
+        Returns the current material point spread. The spread is kept up to
+        date as pieces are added and removed.
         """
-        score = 0
-        for piece in self.piece_generator():
-            # Add material for WHITE
-            if piece.color is Color.WHITE:
-                score += piece.value
-            # Subtract material for BLACK
-            else:
-                score -= piece.value
-        return score
+        return self._material
 
     def play_turn(self):
         """
@@ -799,10 +1300,11 @@ class Board:
                 # DIGITS -- skip that many spaces
                 if char.isdigit():
                     skips += int(char) - 1
-                # LETTER -- make a piece with it
+                # LETTER -- make a piece with it ( squares are empty after
+                # reset, so place it directly without the locus dispatch )
                 else:
                     col = c + skips
-                    self[(r, col)] = Piece.from_str(char, row=r, col=col)
+                    self._set_coord(r, col, Piece.from_str(char, row=r, col=col))
 
         # Determine whose move
         to_move = fields[1].lower()
@@ -838,26 +1340,24 @@ class Board:
         """
         Constructs a FEN formatted string representation of the current board.
         """
-        # Get board str
-        row_strs = [ ]
-        for row in self.board:
-            row_str = ""
-            skips = 0
-            for piece in row:
-                if piece is None:
-                    skips += 1
-                elif skips != 0:
-                    row_str += str(skips)
-                    skips = 0
-
-                if skips == 0:
-                    row_str += str(piece)
+        # Get board str in a single pass over the board
+        chars = [ ]
+        skips = 0
+        for index, piece in enumerate(self.board):
+            if piece is None:
+                skips += 1
             else:
-                # Handle empty rows
                 if skips != 0:
-                    row_str += str(skips)
-            row_strs.append(row_str)
-        board_str = "/".join(row_strs)
+                    chars.append(str(skips))
+                    skips = 0
+                chars.append(piece.letter())
+            # Close the row ( handles empty rows )
+            if index % N_FILES == N_FILES - 1:
+                if skips != 0:
+                    chars.append(str(skips))
+                    skips = 0
+                chars.append("/")
+        board_str = "".join(chars[:-1])
 
         # Get to move
         move_str = self.to_move.name[0].lower()
@@ -904,13 +1404,28 @@ class Board:
         squares.
         """
         if self._board_fmt_str is None:
-            edge_line =  "+" + "---+" * N_FILES + "\n"
-            piece_line = "|" + "{}|" * N_FILES + "\n"
-            self._board_fmt_str = edge_line
+            self._board_fmt_str = EDGE_LINE + "\n"
             for _ in Square.ROW_RANGE:
-                self._board_fmt_str += piece_line + edge_line
+                self._board_fmt_str += PIECE_LINE + "\n" + EDGE_LINE + "\n"
         return self._board_fmt_str
 
+    def row_str(self, row, reverse=False):
+        """
+        Get the formatted string of the pieces in a row. Rows are only
+        formatted again after one of their squares changes.
+        """
+        if self._row_unicode is not UNICODE_PIECES:
+            self._row_strs = [ None ] * N_RANKS
+            self._row_unicode = UNICODE_PIECES
+        row_strs = self._row_strs[row]
+        if row_strs is None:
+            cells = [ "   " if p is None else f" {p} "
+                        for p in self.board[N_FILES * row:N_FILES * (row + 1)] ]
+            row_strs = ( "|" + "|".join(cells) + "|",
+                         "|" + "|".join(reversed(cells)) + "|" )
+            self._row_strs[row] = row_strs
+        return row_strs[reverse]
+
     def filled_board_str(self, orient=Color.WHITE, notate=False, notate_prefix="", highlights=[]):
         """
         Populates the empty board format string with the pieces from the
@@ -925,36 +1440,40 @@ class Board:
         else:
             reverse = False
 
-        wrapped = ( (self[s], "({})") if s in highlights else (self[s], " {} ")
-                        for s in self.square_list(reverse=reverse) )
-        str_gen = ( wrap.format(" ") if p is None else wrap.format(p)
-                        for p, wrap in wrapped )
-        filled = self.board_fmt_str.format(*str_gen)
-
-        if notate:
-            if reverse:
-                row_range = range(N_RANKS - 1, -1, -1)
-                col_range = range(N_FILES - 1, -1, -1)
+        highlighted = { self._locus_index(s) for s in highlights }
+        highlight_rows = { index // N_FILES for index in highlighted }
+        lines = [ EDGE_LINE ]
+        for row in (reversed(Square.ROW_RANGE) if reverse else Square.ROW_RANGE):
+            if row in highlight_rows:
+                squares = SQUARES[N_FILES * row:N_FILES * (row + 1)]
+                if reverse:
+                    squares = reversed(squares)
+                cells = [ ]
+                for s in squares:
+                    p = self.board[s.index]
+                    p = " " if p is None else p
+                    cells.append(f"({p})" if s.index in highlighted else f" {p} ")
+                lines.append("|" + "|".join(cells) + "|")
             else:
-                row_range = range(0, N_RANKS)
-                col_range = range(0, N_FILES)
-            # Add rank numbers
-            rank_fmt = " {} "
-            rank_gen = ( Square.row_to_rank(r) for r in row_range )
-            filled_rows = filled.strip().split("\n")
-            filled = ""
-            for i, row in enumerate(filled_rows):
-                filled += notate_prefix
-                if i % 2 == 1:
-                    filled += rank_fmt.format(next(rank_gen))
-                else:
-                    filled += rank_fmt.format(" ")
-                filled += row + "\n"
-            # Add file letters
-            file_gen = ( Square.col_to_file(c) for c in col_range )
-            files = " " + " ".join(" {} ".format(l) for l in file_gen)
-            filled += notate_prefix + rank_fmt.format(" ") + files
-        return filled
+                lines.append(self.row_str(row, reverse=reverse))
+            lines.append(EDGE_LINE)
+        if not notate:
+            return "\n".join(lines) + "\n"
+
+        if reverse:
+            ranks = RANK_DIGITS[::-1]
+            files = FILE_LETTERS[::-1]
+        else:
+            ranks = RANK_DIGITS
+            files = FILE_LETTERS
+        # Add rank numbers beside the piece rows
+        notated = [ ]
+        for i, line in enumerate(lines):
+            rank = ranks[i // 2] if i % 2 == 1 else " "
+            notated.append(f"{notate_prefix} {rank} {line}")
+        # Add file letters
+        notated.append(f"{notate_prefix}    " + " ".join(f" {f} " for f in files))
+        return "\n".join(notated)
 
     def print_square_moves(self, from_square):
         """
@@ -964,7 +1483,7 @@ class Board:
         if piece is None:
             print(f"{from_square} is empty!")
         elif piece.square in self.allowed_moves:
-            print(f"{piece!r}: {self.allowed_moves[from_square]}")
+            print(f"{piece!r}: {set(self.allowed_moves[from_square])}")
             print(self.moves_board_str(from_square) + "\n")
         else:
             print(f"No valid moves for {piece!r}!")
@@ -1055,11 +1574,11 @@ class Move:
 
         # If promotion, remove piece and add new one
         if promote_type is not None:
-            additions.append( promote_type(to_square, piece.color, has_moved=True) )
+            additions.append( promote_type.shared(to_square, piece.color, has_moved=True) )
             removals.append(piece)
         # Otherwise just move the piece
         else:
-            additions.append( type(piece)(to_square, piece.color, has_moved=True) )
+            additions.append( type(piece).shared(to_square, piece.color, has_moved=True) )
             removals.append(piece)
         # Determine if capture
         if target is not None:
@@ -1074,7 +1593,7 @@ class Move:
         if isinstance(piece, Pawn):
             d_row = to_square.row - from_square.row
             if abs(d_row) == 2:
-                en_passant_square = Square(from_square.row + d_row/2, from_square.col)
+                en_passant_square = Square.from_coord(from_square.row + d_row // 2, from_square.col)
 
         # Determine if castle
         if isinstance(piece, King):
@@ -1082,14 +1601,14 @@ class Move:
             # King side castle
             if d_col == 2:
                 rook = board[ board.rook_homes[piece.color][1] ]
-                rook_to = Square( to_square.row, to_square.col - 1 )
-                additions.append( Rook(rook_to, rook.color, has_moved=True) )
+                rook_to = Square.from_coord(to_square.row, to_square.col - 1)
+                additions.append( Rook.shared(rook_to, rook.color, has_moved=True) )
                 removals.append( rook )
             # Queen side castle
             elif d_col == -2:
                 rook = board[ board.rook_homes[piece.color][0] ]
-                rook_to = Square( to_square.row, to_square.col + 1 )
-                additions.append( Rook(rook_to, rook.color, has_moved=True) )
+                rook_to = Square.from_coord(to_square.row, to_square.col + 1)
+                additions.append( Rook.shared(rook_to, rook.color, has_moved=True) )
                 removals.append( rook )
             # Any king move prevents future castles
             if board.castle_states[piece.color]["Q"]:
@@ -1143,9 +1662,9 @@ class Move:
         if pgn_str.upper() in ( "O-O", "O-O-O" ):
             from_square = board.find_king().square
             if len(pgn_str) == 3:
-                to_square = Square(from_square.row, from_square.col + 2)
+                to_square = Square.from_coord(from_square.row, from_square.col + 2)
             else:
-                to_square = Square(from_square.row, from_square.col - 2)
+                to_square = Square.from_coord(from_square.row, from_square.col - 2)
             return from_square, to_square, promote_type
 
         # Handle PROMOTIONS
@@ -1228,6 +1747,9 @@ class Piece:
     value = None # Material point value
 
     _CHAR_LOOKUP = {}
+    _LETTER_LOOKUP = {} # letter -> (class, color) for both cases
+
+    __slots__ = ( "color", "has_moved", "square", "row", "col", "rank", "file" )
 
     def __init__(self, locus, color=Color.WHITE, has_moved=False):
         # Core attributes
@@ -1246,6 +1768,11 @@ class Piece:
         elif isinstance(locus, Pawn):
             self.color = locus.color
             self.square = locus.square
+        # Pieces never change square, so keep plain copies of its coordinates
+        self.row = self.square.row
+        self.col = self.square.col
+        self.rank = self.square.rank
+        self.file = self.square.file
 
     def __init_subclass__(cls, **kwargs):
         """
@@ -1262,38 +1789,44 @@ class Piece:
             raise AttributeError(f"_char for {cls.__name__} is already taken by {Piece._CHAR_LOOKUP[cls._char].__name__}")
         # Add to the lookup
         Piece._CHAR_LOOKUP[cls._char] = cls
+        Piece._LETTER_LOOKUP[cls._char] = (cls, Color.WHITE)
+        Piece._LETTER_LOOKUP[cls._char.lower()] = (cls, Color.BLACK)
+        # Letters by color ( see letter )
+        cls._letters = { Color.WHITE: cls._char, Color.BLACK: cls._char.lower() }
+        # Capture masks by color and has_moved, then square ( see capture_mask )
+        cls._capture_tables = { }
+        # Shared instances by square, color and has_moved ( see shared )
+        cls._instances = { }
+        # Zobrist keys for each color and square
+        cls._zobrist = {
+            color: zobrist_keys(N_RANKS * N_FILES) for color in (Color.WHITE, Color.BLACK)
+        }
+
+    @classmethod
+    def shared(cls, square, color=Color.WHITE, has_moved=False):
+        """
+        Get the shared piece of this type on the square. Pieces are never
+        modified after creation ( moves replace them ), so each state only
+        needs one instance.
+        """
+        key = (square.index, color, has_moved)
+        piece = cls._instances.get(key)
+        if piece is None:
+            piece = cls(SQUARES[square.index], color=color, has_moved=has_moved)
+            cls._instances[key] = piece
+        return piece
 
     @classmethod
     def from_str(cls, piece_char, row=0, col=0):
         """
         Takes a string with 1 letter identifying a piece. Returns that piece.
         """
-        # Determine color
-        if piece_char.isupper():
-            color = Color.WHITE
-        else:
-            color = Color.BLACK
-        # Determine piece type
+        # Determine piece type and color
         try:
-            return cls._CHAR_LOOKUP[piece_char.upper()]((row, col), color=color)
+            piece_type, color = cls._LETTER_LOOKUP[piece_char]
         except KeyError:
             raise ValueError(f"Unrecognized piece string: {piece_char!r}")
-
-    @property
-    def row(self):
-        return self.square.row
-
-    @property
-    def col(self):
-        return self.square.col
-
-    @property
-    def rank(self):
-        return self.square.rank
-
-    @property
-    def file(self):
-        return self.square.file
+        return piece_type.shared(Square.from_coord(row, col), color=color)
 
     def generate_row(self):
         for col in range(0, self.col):
@@ -1320,21 +1853,47 @@ class Piece:
     def move_is_valid(self, d_row, d_col, capture=False):
         raise NotImplementedError()
 
+    def attack_mask(self, occupied):
+        """
+        Mask of squares attacked by the piece for the given occupancy. None
+        for pieces without an attack table, whose targets come from
+        pseudovalid_coords and capture_mask instead.
+        """
+        return None
+
+    def capture_mask(self):
+        """
+        Mask of squares that move_is_valid allows the piece to capture on,
+        ignoring blockers. Each class builds a table per color and has_moved
+        from its own move_is_valid on first use.
+        """
+        key = (self.color, self.has_moved)
+        table = self._capture_tables.get(key)
+        if table is None:
+            table = [ ]
+            for square in SQUARES:
+                piece = type(self).shared(square, self.color, self.has_moved)
+                mask = MASK_EMPTY
+                for target in SQUARES:
+                    d_row, d_col = target.row - square.row, target.col - square.col
+                    if target is not square and piece.move_is_valid(d_row, d_col, capture=True):
+                        mask |= 1 << target.index
+                table.append(mask)
+            self._capture_tables[key] = table
+        return table[self.square.index]
+
     def letter(self):
         """
         Single character representation of piece.
         Uppercase for WHITE, lowercase for BLACK.
         """
-        if self.color is Color.BLACK:
-            return self._char.lower()
-        else:
-            return self._char
+        return self._letters[self.color]
 
     def u_str(self):
         """
         Unicode representation of piece
         """
-        return UNICODE_PIECE_SYMBOLS[self.letter()]
+        return UNICODE_PIECE_SYMBOLS[self._letters[self.color]]
 
     @property
     def name(self):
@@ -1345,9 +1904,9 @@ class Piece:
 
     def __str__(self):
         if UNICODE_PIECES:
-            return self.u_str()
+            return UNICODE_PIECE_SYMBOLS[self._letters[self.color]]
         else:
-            return self.letter()
+            return self._letters[self.color]
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.square}, {self.color.name})"
@@ -1355,6 +1914,7 @@ class Piece:
 
 class Pawn(Piece):
     value = 1
+    __slots__ = ( )
 
     def pseudovalid_coords_regular(self):
         """
@@ -1372,32 +1932,36 @@ class Pawn(Piece):
         """
         Generate all squares that the piece could potentially move to (captures only)
         """
+        row = self.row + self.color.orientation
+        if not 0 <= row < N_RANKS:
+            return
         if self.col < N_FILES - 1:
-            yield self.row + self.color.orientation, self.col + 1
+            yield row, self.col + 1
         if self.col > 0:
-            yield self.row + self.color.orientation, self.col - 1
+            yield row, self.col - 1
 
-    def move_is_valid(self, d_row, d_col, capture=False, **kwargs):
+    def move_is_valid(self, d_row, d_col, capture=False):
         """
         Can move forward 2 if it has not yet moved. Otherwise can only move 1.
         If the move is a capture, it can move diagonally
         """
+        forward = self.color.orientation * d_row
         # If move is a capture, only allow forward diagonal moves by 1 space
         if capture:
-            if abs(d_col) == ( self.color.orientation * d_row ) == 1:
-                return True
-            else:
-                return False
-        else:
-            # Only allow forward moves by 1 (if has not moved, then allow 2)
-            if d_col == 0 and ( self.color.orientation * d_row == 1 or (not self.has_moved and self.color.orientation * d_row == 2) ):
-                return True
-            else:
-                return False
+            return abs(d_col) == forward == 1
+        # Only allow forward moves by 1 (if has not moved, then allow 2)
+        return d_col == 0 and ( forward == 1 or (forward == 2 and not self.has_moved) )
+
+    def attack_mask(self, occupied):
+        """
+        Diagonal capture squares ( pushes never capture ).
+        """
+        return PAWN_ATTACKS[self.color][self.square.index]
 
 
 class Bishop(Piece):
     value = 3
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1406,20 +1970,24 @@ class Bishop(Piece):
         return self.generate_diag()
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Rank and file must change by same amount
         """
-        if abs(d_col) == abs(d_row) != 0:
-            return True
-        else:
-            return False
+        return abs(d_col) == abs(d_row) != 0
+
+    def attack_mask(self, occupied):
+        """
+        Sliding diagonal attacks up to the first blocker.
+        """
+        return diagonal_attacks(self.square.index, occupied)
 
 
 class Knight(Piece):
     _char = "N"
     value = 3
     jumps = True
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1436,18 +2004,22 @@ class Knight(Piece):
                 yield row, col
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Rank or file must change by 2, the other must change by 1
         """
-        if set(( abs(d_col), abs(d_row) )) == set(( 1, 2 )):
-            return True
-        else:
-            return False
+        return (d_row, d_col) in KNIGHT_DELTAS
+
+    def attack_mask(self, occupied):
+        """
+        Knight jump targets.
+        """
+        return KNIGHT_ATTACKS[self.square.index]
 
 
 class Rook(Piece):
     value = 5
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1459,18 +2031,22 @@ class Rook(Piece):
             yield coord
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Rank or file can change any amount, but one must not change
         """
-        if ( d_col == 0 and d_row != 0 ) or ( d_row == 0 and d_col != 0 ):
-            return True
-        else:
-            return False
+        return (d_row == 0) != (d_col == 0)
+
+    def attack_mask(self, occupied):
+        """
+        Sliding rank and file attacks up to the first blocker.
+        """
+        return straight_attacks(self.square.index, occupied)
 
 
 class Queen(Piece):
     value = 9
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1483,18 +2059,23 @@ class Queen(Piece):
             yield coord
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Can make any move that is valid for Rook or Bishop
         """
-        if Bishop.move_is_valid(d_col, d_row) or Rook.move_is_valid(d_col, d_row):
-            return True
-        else:
-            return False
+        return (d_row == 0) != (d_col == 0) or abs(d_col) == abs(d_row) != 0
+
+    def attack_mask(self, occupied):
+        """
+        Sliding attacks of a Rook and a Bishop combined.
+        """
+        return ( diagonal_attacks(self.square.index, occupied) |
+                 straight_attacks(self.square.index, occupied) )
 
 
 class King(Piece):
     value = 5
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1505,25 +2086,24 @@ class King(Piece):
             yield self.row + d_row, self.col + d_col
 
     @staticmethod
-    def move_is_valid(d_row, d_col, castle=False, **kwargs):
+    def move_is_valid(d_row, d_col, castle=False, capture=False):
         """
         Can move 1 square any direction, or diagonally
         """
         if castle:
-            if abs(d_row) == 0 and abs(d_col) == 2:
-                return True
-            else:
-                return False
+            return d_row == 0 and abs(d_col) == 2
+        return (d_row, d_col) in KING_DELTAS
 
-        else:
-            if set(( abs(d_col), abs(d_row) )).issubset( set(( 0, 1 )) ):
-                return True
-            else:
-                return False
+    def attack_mask(self, occupied):
+        """
+        Adjacent squares ( excludes castles ).
+        """
+        return KING_ATTACKS[self.square.index]
 
 class Centaur(Piece):
     value = 5
     jumps = True
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1545,19 +2125,22 @@ class Centaur(Piece):
                 yield row, col
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Can move 1 square any direction, or diagonally
         """
-        if set(( abs(d_col), abs(d_row) )).issubset( set(( 0, 1 )) ) or \
-           set(( abs(d_col), abs(d_row) )) == set(( 1, 2 )):
-            return True
-        else:
-            return False
+        return (d_row, d_col) in KING_DELTAS or (d_row, d_col) in KNIGHT_DELTAS
+
+    def attack_mask(self, occupied):
+        """
+        Adjacent squares and knight jump targets.
+        """
+        return KING_ATTACKS[self.square.index] | KNIGHT_ATTACKS[self.square.index]
 
 class Zebra(Piece):
     value = 3
     jumps = True
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1575,18 +2158,22 @@ class Zebra(Piece):
                 yield row, col
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Can move 1 square any direction, or diagonally
         """
-        if set(( abs(d_col), abs(d_row) )) == set(( 2, 3 )):
-            return True
-        else:
-            return False
+        return (d_row, d_col) in ZEBRA_DELTAS
+
+    def attack_mask(self, occupied):
+        """
+        Zebra ( 3, 2 ) jump targets.
+        """
+        return ZEBRA_ATTACKS[self.square.index]
 
 class Giraffe(Piece):
     value = 2
     jumps = True
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1604,17 +2191,21 @@ class Giraffe(Piece):
                 yield row, col
 
     @staticmethod
-    def move_is_valid(d_row, d_col, **kwargs):
+    def move_is_valid(d_row, d_col, capture=False):
         """
         Can move 1 square any direction, or diagonally
         """
-        if set(( abs(d_col), abs(d_row) )) == set(( 4, 1 )):
-            return True
-        else:
-            return False
+        return (d_row, d_col) in GIRAFFE_DELTAS
+
+    def attack_mask(self, occupied):
+        """
+        Giraffe ( 4, 1 ) jump targets.
+        """
+        return GIRAFFE_ATTACKS[self.square.index]
 
 class Elephant(Piece):
     value = 2
+    __slots__ = ( )
 
     def pseudovalid_coords(self):
         """
@@ -1626,19 +2217,37 @@ class Elephant(Piece):
         yield self.row - 1, self.col + 1
         yield self.row - 1, self.col - 1
 
-    def move_is_valid(self, d_row, d_col, capture=False, **kwargs):
+    def move_is_valid(self, d_row, d_col, capture=False):
         """
         Can move forward 2 if it has not yet moved. Otherwise can only move 1.
         If the move is a capture, it can move diagonally
         """
-        # Allow forward moves by 1
-        if d_col == 0 and ( self.color.orientation * d_row == 1  ):
-            return True
-        # Diagonal moves
-        elif abs(d_col) == abs(d_row) == 1:
-            return True
-        else:
-            return False
+        # Allow forward moves by 1, or diagonal moves by 1
+        return ( d_col == 0 and self.color.orientation * d_row == 1 ) or abs(d_col) == abs(d_row) == 1
+
+    def attack_mask(self, occupied):
+        """
+        Diagonal neighbors and the square ahead.
+        """
+        return ELEPHANT_ATTACKS[self.color][self.square.index]
+
+# Piece types covered by the reverse lookups in Board.attackers_mask
+TABLE_PIECES = frozenset(( Pawn, Bishop, Knight, Rook, Queen, King,
+                           Centaur, Zebra, Giraffe, Elephant ))
+
+def _check_attack_tables():
+    """
+    Make sure every hand built attack table matches its piece's
+    move_is_valid on an empty board.
+    """
+    for piece_type in TABLE_PIECES:
+        for color in (Color.WHITE, Color.BLACK):
+            for square in SQUARES:
+                piece = piece_type.shared(square, color)
+                if piece.attack_mask(MASK_EMPTY) != piece.capture_mask():
+                    raise AttributeError(f"{piece_type.__name__} attack table does not match move_is_valid on {square}")
+
+_check_attack_tables()
 
 ###############################################################################
 #  MAIN                                                                       #
@@ -17,6 +17,14 @@ ARROW_RGB = (49, 175, 80) # green
 # GEOMETRY
 SQUARE_PIX = 81 # pixels
 MARGIN_PIX = 10 # pixels
+CORNER_PIX = 14 # pixels
+
+# Corner highlight triangles as (tip, edge, edge) offsets from a square corner
+CORNER_TRIANGLES = tuple(
+    ( (x, y), (x - dx * CORNER_PIX, y), (x, y - dy * CORNER_PIX) )
+    for dx, x in ( (-1, 0), (1, SQUARE_PIX - 1) )
+    for dy, y in ( (-1, 0), (1, SQUARE_PIX - 1) )
+)
 
 def square_center(row, col, flipped=False):
     if not flipped:
@@ -46,34 +54,44 @@ def pix_to_square(x, y, flipped=False):
     # Restrict to board
     row = min(max(row, 0), core.N_RANKS - 1)
     col = min(max(col, 0), core.N_FILES - 1)
-    return core.Square(row, col)
+    return core.Square.from_coord(row, col)
 
 
 class PieceIcon(pygame.sprite.Sprite):
     """
     Chess piece sprite.
     """
+    # Scaled images shared by all sprites of the same piece name and color
+    _image_cache = { }
+
     def __init__(self, chess_piece, flipped=False):
         super().__init__()
         self.image = self.get_image(chess_piece)
         self.rect = self.image.get_rect()
-        self.layer = 0
 
         self.piece_color = chess_piece.color
         self.piece_type = type(chess_piece)
         self.set_square(chess_piece.square, flipped=flipped)
 
-    @staticmethod
-    def get_image(chess_piece):
+    @classmethod
+    def get_image(cls, chess_piece):
         """
-        Get a scaled image for the input chess piece.
+        Get a scaled image for the input chess piece. Each image is only
+        loaded and scaled the first time it is requested.
         """
         piece_name = chess_piece.name.lower()
-        piece_color = chess_piece.color.name
-        image_dir = os.path.join(os.path.dirname(__file__), "icons")
-        image_path = os.path.join(image_dir, f"{piece_name}_{piece_color}.png")
-        image = pygame.image.load(image_path)
-        return pygame.transform.smoothscale(image, (SQUARE_PIX, SQUARE_PIX))
+        piece_color = chess_piece.color.name.lower()
+        key = (piece_name, piece_color)
+        if key not in cls._image_cache:
+            image_dir = os.path.join(os.path.dirname(__file__), "icons")
+            image_path = os.path.join(image_dir, f"{piece_name}_{piece_color}.png")
+            image = pygame.image.load(image_path).convert_alpha()
+            cls._image_cache[key] = pygame.transform.smoothscale(image, (SQUARE_PIX, SQUARE_PIX))
+        return cls._image_cache[key]
+
+    @classmethod
+    def clear_image_cache(cls):
+        cls._image_cache.clear()
 
     @property
     def row(self):
@@ -92,12 +110,10 @@ class PieceIcon(pygame.sprite.Sprite):
         return
 
     def nearest_square(self, flipped=False):
-        return pix_to_square(self.rect.centerx, self.rect.centery, flipped=flipped)
+        return pix_to_square(*self.rect.center, flipped=flipped)
 
-    def drag(self):
-        pos = pygame.mouse.get_pos()
-        self.rect.centerx = pos[0]
-        self.rect.centery = pos[1]
+    def drag(self, pos):
+        self.rect.center = pos
 
 
 class BoardIcon(pygame.Surface):
@@ -122,20 +138,33 @@ class Game:
     def __init__(self, board):
         # Connect board/game engine
         self.board = board
-        # Create display
         self.flipped = False
-        board_width = SQUARE_PIX * len(self.board.board[0])
-        board_height = SQUARE_PIX * len(self.board.board)
+        # Display and images are created by __enter__ once pygame is running
+        self.screen = None
+        self.board_icon = None
+        self.sprites = pygame.sprite.Group()
+        self.sprite_grid = [ None ] * (core.N_RANKS * core.N_FILES)
+
+        self.latched = None
+        self._mouse_pos = (0, 0)
+
+    def setup_display(self):
+        """
+        Create the display, then build the board and piece images in the
+        display pixel format.
+        """
+        board_width = SQUARE_PIX * core.N_FILES
+        board_height = SQUARE_PIX * core.N_RANKS
         dimensions = (board_width + 2 * MARGIN_PIX, board_height + 2 * MARGIN_PIX)
         self.screen = pygame.display.set_mode(dimensions)
         # Generate images
-        self.board_icon = BoardIcon(board_width, board_height, SQUARE_PIX)
-        self.sprites = pygame.sprite.LayeredUpdates()
+        self.board_icon = BoardIcon(board_width, board_height, SQUARE_PIX).convert()
+        self.sprites.empty()
         for piece in self.board.piece_generator():
-            self.sprites.add( PieceIcon(piece), flipped=self.flipped )
-        self.sprite_lookup = { piece.square: piece for piece in self.sprites.get_sprites_from_layer(0) }
-
-        self.latched = None
+            self.sprites.add( PieceIcon(piece, flipped=self.flipped) )
+        self.sprite_grid = [ None ] * (core.N_RANKS * core.N_FILES)
+        for piece in self.sprites:
+            self.sprite_grid[piece.square.index] = piece
 
     def draw_square_highlight(self, square, color):
         corner = square_corner(square.row, square.col, flipped=self.flipped)
@@ -143,16 +172,10 @@ class Game:
         pygame.draw.rect(self.screen, color, rect)
 
     def draw_corner_highlight(self, square):
-        corner = square_corner(square.row, square.col, flipped=self.flipped)
-        for dx, dy in itertools.product([-1, 1], repeat=2):
-            p0 = [corner[0], corner[1]]
-            if dx == 1:
-                p0[0] += SQUARE_PIX - 1
-            if dy == 1:
-                p0[1] += SQUARE_PIX - 1
-            p1 = [p0[0] - dx * 14, p0[1]]
-            p2 = [p0[0], p0[1] - dy * 14]
-            pygame.draw.polygon(self.screen, TARGET_RGB, [p0, p1, p2])
+        x, y = square_corner(square.row, square.col, flipped=self.flipped)
+        for triangle in CORNER_TRIANGLES:
+            p0, p1, p2 = [ (x + dx, y + dy) for dx, dy in triangle ]
+            pygame.draw.polygon(self.screen, TARGET_RGB, (p0, p1, p2))
             pygame.draw.aaline(self.screen, TARGET_RGB, p1, p2)
 
     def draw_target_dot(self, square):
@@ -170,7 +193,7 @@ class Game:
         state.
         """
         moveable = [ ]
-        for piece in self.sprites.get_sprites_from_layer(0):
+        for piece in self.sprites:
             if piece.square in self.board.allowed_moves:
                 moveable.append(piece)
         return moveable
@@ -188,14 +211,14 @@ class Game:
         """
         Mouse down event.
         """
-        for piece in self.sprites.get_sprites_from_layer(0):
+        for piece in self.sprites:
             if isinstance(self.latched, PieceIcon):
                 break
             elif piece.piece_color != self.board.to_move:
                 continue
             elif piece.rect.collidepoint(event.pos) == True:
-                self.sprites.move_to_front(piece)
                 self.latched = piece
+                self._mouse_pos = event.pos
         return
 
     def drop(self):
@@ -220,13 +243,13 @@ class Game:
         """
         # Update sprites
         for piece in move.removals:
-            sprite = self.sprite_lookup[piece.square]
-            self.sprites.remove(sprite)
-            del self.sprite_lookup[piece.square]
+            index = piece.square.index
+            self.sprites.remove(self.sprite_grid[index])
+            self.sprite_grid[index] = None
         for piece in move.additions:
             sprite = PieceIcon(piece, flipped=self.flipped)
             self.sprites.add( sprite )
-            self.sprite_lookup[piece.square] = sprite
+            self.sprite_grid[piece.square.index] = sprite
 
     def attempt_move(self, from_square, to_square):
         try:
@@ -256,17 +279,56 @@ class Game:
         for piece in self.sprites:
             piece.snap_to_square(flipped=self.flipped)
 
+    def draw(self):
+        """
+        Draw the board, highlights and pieces to the screen.
+        """
+        # Draw board
+        self.screen.fill(BG_RGB)
+        self.screen.blit(self.board_icon, (MARGIN_PIX, MARGIN_PIX))
+        if self.board.check:
+            self.draw_square_highlight(self.board.find_king().square, CHECK_RGB)
+        if self.board.winner is not None:
+            self.draw_square_highlight(self.board.find_king(self.board.winner).square, ARROW_RGB)
+
+        # Update and draw pieces
+        if isinstance(self.latched, PieceIcon):
+            self.latched.drag(self._mouse_pos)
+            self.show_moves(self.latched)
+        # Dragged piece is drawn last so it stays on top
+        pieces = [ piece for piece in self.sprites if piece is not self.latched ]
+        if isinstance(self.latched, PieceIcon):
+            pieces.append(self.latched)
+        self.screen.blits([ (piece.image, piece.rect) for piece in pieces ], doreturn=False)
+
     def loop(self):
         """
-        Run the game loop
+        Run the game loop. Frames are only redrawn after an event changes
+        the game state, or continuously while a piece is being dragged.
         """
         game_clock = pygame.time.Clock()
         game_exit = False
+        redraw = True
         while not game_exit:
+            if redraw:
+                self.draw()
+                pygame.display.flip()
+
+            # Sleep until the next event unless a piece is being dragged
+            if self.latched is None:
+                events = [ pygame.event.wait() ] + pygame.event.get()
+            else:
+                events = pygame.event.get()
+                game_clock.tick(60)
+
             # Process events
-            for event in pygame.event.get():
+            redraw = self.latched is not None
+            for event in events:
                 if event.type == pygame.QUIT:
                     game_exit = True
+                elif event.type == pygame.MOUSEMOTION:
+                    self._mouse_pos = event.pos
+                    continue
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     if self.latched is None:
                         self.grab(event)
@@ -279,29 +341,16 @@ class Game:
                         self.undo_move()
                     if event.key == pygame.K_f:
                         self.flip_board()
-
-            # Draw board
-            self.screen.fill(BG_RGB)
-            self.screen.blit(self.board_icon, (MARGIN_PIX, MARGIN_PIX))
-            if self.board.check:
-                self.draw_square_highlight(self.board.find_king().square, CHECK_RGB)
-            if self.board.winner is not None:
-                self.draw_square_highlight(self.board.find_king(self.board.winner).square, ARROW_RGB)
-
-            # Update and draw pieces
-            if isinstance(self.latched, PieceIcon):
-                self.latched.drag()
-                self.show_moves(self.latched)
-            self.sprites.draw(self.screen)
-
-            pygame.display.flip()
-            game_clock.tick(60)
+                redraw = True
         return
 
     def __enter__(self):
         pygame.init()
         pygame.display.set_caption("Chess")
+        self.setup_display()
         return self
 
     def __exit__(self, *args):
+        # Cached images are in the pixel format of this display
+        PieceIcon.clear_image_cache()
         pygame.quit()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests for the allowed move cache.
+"""
+import pytest
+
+from chess import core
+
+
+class Hopper(core.Piece):
+    """
+    Jumps 2 squares orthogonally until it has moved, then 1 square.
+    """
+    jumps = True
+    value = 1
+    __slots__ = ( )
+
+    def step(self):
+        return 1 if self.has_moved else 2
+
+    def pseudovalid_coords(self):
+        n = self.step()
+        for d_row, d_col in ( (n, 0), (-n, 0), (0, n), (0, -n) ):
+            yield self.row + d_row, self.col + d_col
+
+    def move_is_valid(self, d_row, d_col, capture=False):
+        n = self.step()
+        return (abs(d_row), abs(d_col)) in ( (n, 0), (0, n) )
+
+
+def play(board, *moves):
+    for from_str, to_str in moves:
+        from_square = core.Square.from_str(from_str)
+        to_square = core.Square.from_str(to_str)
+        board.push_move(core.Move.from_squares(from_square, to_square, board))
+
+
+def hopper_targets(board, square):
+    return sorted(str(s) for s in board.allowed_moves[core.Square.from_str(square)])
+
+
+def test_revisit_with_different_has_moved():
+    board = core.Board("6r1/8/8/8/8/8/8/K6k w - - 0 1")
+    board["D4"] = Hopper("D4", core.Color.WHITE)
+    assert hopper_targets(board, "D4") == [ "B4", "D2", "D6", "F4" ]
+    # Same placement and side to move, but the hopper has now moved
+    play(board, ("D4", "D6"), ("G8", "G7"), ("D6", "D5"),
+                ("G7", "G6"), ("D5", "D4"), ("G6", "G8"))
+    assert hopper_targets(board, "D4") == [ "C4", "D3", "D5", "E4" ]
+
+
+def test_cached_moves_are_read_only():
+    board = core.Board("Standard")
+    e2 = core.Square.from_str("E2")
+    with pytest.raises(TypeError):
+        board.allowed_moves[e2] = set()
+    with pytest.raises(AttributeError):
+        board.allowed_moves[e2].add(core.Square.from_str("E5"))
+    # Revisiting the start position serves the same, unchanged moves
+    play(board, ("G1", "F3"), ("G8", "F6"), ("F3", "G1"), ("F6", "G8"))
+    assert sorted(str(s) for s in board.allowed_moves[e2]) == [ "E3", "E4" ]
+
+
+def mask(*squares):
+    return sum(1 << core.Square.from_str(s).index for s in squares)
+
+
+def test_capture_tables_follow_has_moved():
+    unmoved = Hopper("D4", core.Color.WHITE)
+    moved = Hopper("D4", core.Color.WHITE, has_moved=True)
+    assert unmoved.capture_mask() == mask("B4", "D2", "D6", "F4")
+    assert moved.capture_mask() == mask("C4", "D3", "D5", "E4")